@@ -1,14 +1,27 @@
 from typing import Annotated, Sequence, TypedDict, List
 from langchain_core.messages import BaseMessage , HumanMessage, AIMessage
-from langchain_core.messages import ToolMessage
 from langchain_core.messages import SystemMessage
+from langchain_core.messages import message_chunk_to_message
+from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
 from langgraph.graph.message import add_messages
 from langgraph.graph import StateGraph, END
 from langgraph.prebuilt import ToolNode
 from dotenv import load_dotenv
 from langchain_groq import ChatGroq
+from hashlib import blake2b
+import asyncio
+import atexit
+import httpx
+import json
+import logging
 import os
+import re
+import shelve
+import threading
+import time
+import uuid
+from pathlib import Path
 
 """
 Diagram of the agent’s workflow:
@@ -16,33 +29,75 @@ START → AGENT → TOOLS → (loop back to AGENT) → END
 
 This shows that:
 - The AGENT node talks to the LLM (chat model).
-- The TOOLS node executes functions (update/save).
+- The TOOLS node executes functions (update/patch/save).
 - After tools run, we either loop back (for more edits) or END (if saved).
 """
 
 load_dotenv()  # loads environment variables from .env file
 
+# Debug output goes through logging, so it costs (almost) nothing when turned off.
+# Set DRAFTER_LOG=DEBUG to see it.
+logging.basicConfig(format="[%(levelname)s] %(message)s")
+log = logging.getLogger("drafter")
+_log_level = os.getenv("DRAFTER_LOG", "INFO").upper()
+if isinstance(logging.getLevelName(_log_level), int):  # a known level name like DEBUG or INFO
+    log.setLevel(_log_level)
+else:
+    log.setLevel(logging.INFO)
+    log.warning("Unknown DRAFTER_LOG level %r, using INFO.", _log_level)
+
 api_key = os.getenv("GROQ_API_KEY")  # fetch Groq API key from environment
 if api_key:
-    print("API key: ", api_key[:8] + "************")  # print first few chars for debugging
+    log.debug("API key: %s************", api_key[:8])  # log first few chars for debugging
 else:
     raise Exception("API key not found.")  # crash if no key found
 
 # -----------GLOBAL VARIABLE---------------
 """
 This variable stores the latest version of the document.
-We keep it global so that tools (update/save) can modify it directly.
+We keep it global so that tools (update/patch/save) can modify it directly.
 In LangGraph, the proper way would be "Injected State",
 but here we keep it simple with a global string.
 """
 document_content = ""
+_last_sent_doc_hash = hash(document_content)  # hash of the draft the LLM last saw (nothing to send while empty)
 
 
 # ---------------------------DEFINE AGENT STATE-------------
+HISTORY_WINDOW = 12  # how many recent messages are kept (and resent to the LLM) each turn
+
+
+def windowed_add(existing: Sequence[BaseMessage], new: Sequence[BaseMessage]) -> List[BaseMessage]:
+    """
+    Works like add_messages, but only keeps the last HISTORY_WINDOW messages.
+    Without it every turn resends the whole conversation, so a long session
+    gets slower and more expensive with each message.
+    """
+    messages = add_messages(existing, new)
+    if len(messages) <= HISTORY_WINDOW:
+        return messages
+
+    start = len(messages) - HISTORY_WINDOW
+    # A tool result must come with the AI message that called it, so never start on one
+    while start > 0 and messages[start].type == "tool":
+        start -= 1
+    window = messages[start:]
+
+    # Keep the latest <doc> message even if it is older than the window,
+    # otherwise the LLM would lose track of the current draft
+    for i in range(len(messages) - 1, -1, -1):
+        if messages[i].name == "document":
+            if i < start:
+                window = [messages[i]] + window
+            break
+    return window
+
+
 # AgentState defines what "data" flows through the graph.
 # It must contain a list of messages (conversation history).
 class AgentState(TypedDict):
-    messages: Annotated[Sequence[BaseMessage], add_messages]  # add_messages ensures new msgs are appended properly
+    messages: Annotated[Sequence[BaseMessage], windowed_add]  # appends new msgs like add_messages, keeps only the recent ones
+    saved: bool  # set by the tools node once the save tool succeeded
 
 
 # --------------TOOL---------------------------
@@ -50,121 +105,414 @@ class AgentState(TypedDict):
 def update(content: str) -> str:
     # This tool updates our global draft with new content provided by the LLM
     global document_content
-    print("[DEBUG] update() called with:", repr(content[:100]))  # print first 100 chars for debugging
+    log.debug("update() called with: %r", content[:100])  # log first 100 chars for debugging
     document_content = content  # overwrite document_content
-    print("[DEBUG] document_content after update:", repr(document_content[:100]))
-    return f"Document has been updated successfully! The current draft is: \n{document_content}"
+    log.debug("document_content after update: %r", document_content[:100])
+    return "Document has been updated successfully!"  # the new draft reaches the LLM as a <doc> message next turn
+
+
+@tool(description="This tool will replace the first occurrence of old_substring in the draft with new_substring, for small edits")
+def patch(old_substring: str, new_substring: str) -> str:
+    # Small edits only send the changed text instead of the whole document
+    global document_content
+    log.debug("patch() called with: %r -> %r", old_substring[:100], new_substring[:100])
+    if not old_substring or old_substring not in document_content:  # "" is "in" every string, so reject it explicitly
+        return f"Error: '{old_substring}' was not found in the document. Nothing was changed."
+    document_content = document_content.replace(old_substring, new_substring, 1)  # edit only the first match
+    return "Document has been patched successfully!"
 
 
-@tool()
-def save(filename: str) -> str:
+@tool(response_format="content_and_artifact")
+def save(filename: str) -> tuple[str, bool]:
     """
     This tool saves the draft into a text file.
     It should be the *last* tool called (program ends after saving).
     """
+    # Returns (message for the LLM, saved flag); the flag ends up in ToolMessage.artifact
     global document_content
     # If no .txt extension, add it automatically
     if not filename.endswith(".txt"):
         filename = f"{filename}.txt"
 
     try:
-        # Open file in write mode and dump the content
-        with open(filename, "w") as f:  # default encoding works fine for Unicode
-            f.write(document_content)
-        return f"File '{filename}' saved successfully."
+        # Encode to UTF-8 once (same bytes on every platform) and write it in one go.
+        # Binary mode: no newline translation, and the file object handles partial writes.
+        with Path(filename).open("wb") as f:
+            f.write(document_content.encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())  # make sure the draft is really on disk before we report success
+        return f"File '{filename}' saved successfully.", True
     except Exception as e:
         # Return the error if something goes wrong
-        return f"Error saving file '{filename}': {str(e)}"
+        return f"Error saving file '{filename}': {str(e)}", False
 
 
 # All available tools must be listed here
-tools = [update, save]
+tools = [update, patch, save]
 
 # ----------------CHOOSE MODEL--------------
-# Create a Groq LLM client with the llama3 model and bind our tools to it
-model = ChatGroq(
+# One pooled HTTP/2 connection is kept alive between turns,
+# so only the first request pays for the TCP/TLS handshake
+_KEEPALIVE_SECONDS = 60  # idle connections are closed after this long
+_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=4, keepalive_expiry=_KEEPALIVE_SECONDS)
+
+# Create a Groq LLM client with the llama3 model
+model_plain = ChatGroq(
     model="llama3-70b-8192",  # the reasoning + tool-calling model
-    groq_api_key=api_key
-).bind_tools(tools)  # this tells the model it can use update/save
+    temperature=0,  # deterministic replies keep repeated prompts cache-friendly
+    groq_api_key=api_key,
+    # Every call goes through astream/ainvoke, so only the async client needs the pool
+    http_async_client=httpx.AsyncClient(http2=True, limits=_HTTP_LIMITS)
+)
+# Same client with our tools bound, this tells the model it can use update/patch/save.
+# The tool schemas are sent with every request, so turns that are just chatting use model_plain.
+model_with_tools = model_plain.bind_tools(tools)
+# Same again, but the model MUST answer with a tool call: no prose is generated
+# before the call, so clear edit/save requests finish sooner
+model_forced = model_plain.bind_tools(tools, tool_choice="any")
+
+# Words that mean the user (probably) wants the draft changed or saved → bind the tools.
+# Kept broad on purpose: a missed edit is worse than a few extra schema tokens.
+_EDIT_RE = re.compile(
+    r"\b(save|update|rewrite|edit|change|add|remove|delete|replace|write|draft|create|fix|make|"
+    r"short|long|expand|insert|append|correct|rephrase|reword|revise|improve|polish|translate|format|patch)\w*",
+    re.IGNORECASE
+)
+
+# Only clear edit/save imperatives aimed at the document ("save as x", "shorten it",
+# "make the draft more formal") use model_forced, which MUST call a tool.
+# Broad verbs (write/add/fix/make ...) without an edit complement stay on "tools",
+# so "make it clear what you changed" can still just be answered.
+_DOC_WORDS = r"(it|this|that|the\s+(draft|document|doc|text))"
+_MAKE_COMPLEMENT = (
+    r"((more|less)\s+\w+|shorter|longer|clearer|simpler|friendlier|warmer|punchier|tighter|briefer|"
+    r"formal|informal|casual|concise|professional|polite)\b"
+)
+_COMMAND_RE = re.compile(
+    r"^\s*(please\s+)?("
+    rf"save(\s+{_DOC_WORDS})?\s+(as|to|in)\b"  # save as x / save it to x
+    rf"|save\s+{_DOC_WORDS}\s*[.!]*\s*$"  # save it
+    rf"|(shorten|lengthen|tighten|simplify|rewrite|rephrase|reword|revise|polish|proofread)\s+{_DOC_WORDS}\b"  # always edits
+    rf"|make\s+{_DOC_WORDS}\s+{_MAKE_COMPLEMENT}"  # make it shorter / make the draft more formal
+    r")",
+    re.IGNORECASE
+)
+# "... but don't touch the draft" → never force an edit
+_NEGATION_RE = re.compile(r"\b(don't|dont|do not|without|never|leave)\b", re.IGNORECASE)
+
+# Short confirmations ("yes", "ok, do it") usually accept something the AI just proposed
+_CONFIRM_RE = re.compile(
+    r"^\s*(yes|yeah|yep|yup|sure|ok|okay|fine|great|perfect|go ahead|do it|do that|please do|sounds good|"
+    r"apply|confirm|correct|right|agreed)\b",
+    re.IGNORECASE
+)
+# An AI reply that asks or offers something ("Should I save it?") may get a one-word answer
+_PROPOSAL_RE = re.compile(
+    r"\?\s*$|\b(should i|shall i|would you like|do you want|want me to|let me know|if you'd like)\b",
+    re.IGNORECASE
+)
+
+
+def is_reply_to_ai(user_input: str, last_ai: BaseMessage | None) -> bool:
+    # "yes"/"ok, do it", or anything said right after the AI asked or offered something:
+    # its meaning depends on that AI turn, not just on the words
+    if _CONFIRM_RE.search(user_input):
+        return True
+    return last_ai is not None and isinstance(last_ai.content, str) and _PROPOSAL_RE.search(last_ai.content) is not None
+
+
+def pick_model(user_input: str, last_ai: BaseMessage | None = None) -> str:
+    # Returns "forced" (must call a tool), "tools" (may call one) or "plain" (no tool schemas sent)
+    if _COMMAND_RE.search(user_input) and not _NEGATION_RE.search(user_input):
+        return "forced"
+    # Only drop the tools for clear chat: the user isn't answering a question or proposal
+    if _EDIT_RE.search(user_input) or is_reply_to_ai(user_input, last_ai):
+        return "tools"
+    return "plain"
+
+
+# ----------------CONNECTION WARM-UP--------------
+"""
+The connection to Groq sits idle while the user types, and after
+_KEEPALIVE_SECONDS it is closed. With DRAFTER_WARMUP=1, model_call starts a
+1-token request in the background while waiting for input() whenever the
+connection is cold, so the real request finds DNS, TCP and TLS already done.
+"""
+_last_request_at = None  # time.monotonic() of the last request to Groq (None → never connected)
+_warmup_task = None  # keeps a reference so the background task isn't garbage collected
+
+
+def connection_cold() -> bool:
+    return _last_request_at is None or time.monotonic() - _last_request_at > _KEEPALIVE_SECONDS
+
+
+async def warmup():
+    global _last_request_at
+    try:
+        await model_plain.ainvoke([HumanMessage(content="hi")], max_tokens=1)  # both models share this client
+        _last_request_at = time.monotonic()
+    except Exception as e:
+        log.warning("Warm-up request failed: %s", e)  # not fatal, the real call just connects itself
+
+
+# ----------------SYSTEM PROMPT--------------
+"""
+The instructions never change, so we build the SystemMessage once at import.
+Keeping it byte-identical at the start of every request lets the provider
+reuse its cached prefix instead of reprocessing the whole prompt each turn.
+The live document is sent separately, after the history (see model_call).
+"""
+_STATIC_SYS_PROMPT = """
+You are a helpful document drafter AI assistant.
+Your job is to update, edit, and improve the document based on the user's instructions.
+
+RULES:
+- NEVER output <tool-use>, JSON, or function call text.
+- For small edits, call the `patch` tool with the exact text to replace as "old_substring" and its replacement as "new_substring".
+- Only for new drafts or full rewrites, call the `update` tool with the full new text as the "content" argument.
+- NEVER print the document content in your chat reply.
+- When saving, ONLY call the `save` tool with a filename.
+- After a tool call, your *natural language reply* must be short and conversational (e.g., "I've updated the draft." or "File saved successfully.").
+- The latest version of the document is the most recent text between <doc> and </doc> tags.
+"""
+_SYS_MSG = SystemMessage(content=_STATIC_SYS_PROMPT)
+
+
+# ----------------RESPONSE CACHE--------------
+"""
+While iterating on a draft we often send the exact same conversation twice
+(e.g. re-running the script with the same inputs). Set DRAFTER_RESPONSE_CACHE=1
+to keep LLM replies on disk, keyed by a hash of the full message list, so a
+repeat skips the network round trip. Leave it unset in production.
+"""
+_resp_cache = None
+if os.getenv("DRAFTER_RESPONSE_CACHE") == "1":
+    _resp_cache = shelve.open("resp_cache.db")
+    atexit.register(_resp_cache.close)  # flush to disk when the program exits
+
+
+def _cache_key(messages: List[BaseMessage]) -> str:
+    # Same messages (type, text and tool calls) → same key.
+    # Tool call ids are random per reply, so only the tool name and args count.
+    payload = json.dumps(
+        [(m.type, m.content, [(tc["name"], tc["args"]) for tc in getattr(m, "tool_calls", [])]) for m in messages],
+        sort_keys=True
+    )
+    return blake2b(payload.encode()).hexdigest()
+
+
+def replay(response: AIMessage) -> AIMessage:
+    # Show a cached reply (nothing to stream) and hand back a fresh copy of it
+    print(f"\nAI: {response.content}")
+    # New ids so add_messages appends it as a brand new message and tool results don't clash
+    tool_calls = [{**tc, "id": f"call_{uuid.uuid4().hex}"} for tc in response.tool_calls]
+    return response.model_copy(update={"id": None, "tool_calls": tool_calls})
+
+
+async def stream_invoke(messages: List[BaseMessage], route: str) -> AIMessage:
+    global _last_request_at
+    # Print the reply token by token instead of waiting for the full completion
+    print("\nAI: ", end="", flush=True)
+    response = None
+    if route == "forced":
+        llm = model_forced
+    elif route == "tools":
+        llm = model_with_tools
+    else:
+        llm = model_plain
+    async for chunk in llm.astream(messages):
+        print(chunk.content, end="", flush=True)
+        response = chunk if response is None else response + chunk  # chunks (and tool calls) merge with +
+    print()
+    _last_request_at = time.monotonic()  # the connection is warm again
+    return message_chunk_to_message(response)  # plain AIMessage for the history and the caches
+
+
+async def cached_invoke(messages: List[BaseMessage], route: str) -> AIMessage:
+    # Cache disabled → always ask the LLM
+    if _resp_cache is None:
+        return await stream_invoke(messages, route)
+
+    key = f"{_cache_key(messages)}:{route}"  # each model variant answers differently
+    if key in _resp_cache:
+        return replay(_resp_cache[key])
+
+    response = await stream_invoke(messages, route)
+    _resp_cache[key] = response
+    return response
+
+
+# ----------------SEMANTIC CACHE--------------
+"""
+Users often repeat an instruction in other words ("make it shorter" /
+"shorten it"). Set DRAFTER_SEMANTIC_CACHE=1 (needs `sentence-transformers`)
+to embed each instruction with a small local model and reuse the earlier
+reply when a new one is nearly identical. Entries are grouped by the draft
+and the model route, so a reply and its tool calls are only reused on the
+same document. Confirmations and answers to an AI question ("yes", "do it")
+skip the cache: they mean something different after every question.
+"""
+SEMANTIC_THRESHOLD = 0.95  # cosine similarity needed to count as the same instruction
+_st_model = None
+if os.getenv("DRAFTER_SEMANTIC_CACHE") == "1":
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+    _st_model = SentenceTransformer("all-MiniLM-L6-v2")
+_semantic_cache = {}  # (draft hash, model route) → (embeddings matrix (n, d), replies)
+
+
+def semantic_get(key: tuple, embedding) -> AIMessage | None:
+    if key not in _semantic_cache:
+        return None
+    embeddings, replies = _semantic_cache[key]
+    scores = embeddings @ embedding  # embeddings are normalized → dot product = cosine similarity
+    best = int(scores.argmax())
+    return replies[best] if scores[best] >= SEMANTIC_THRESHOLD else None
+
+
+def semantic_put(key: tuple, embedding, response: AIMessage) -> None:
+    embeddings, replies = _semantic_cache.get(key, (np.empty((0, embedding.shape[0]), dtype=embedding.dtype), []))
+    _semantic_cache[key] = (np.vstack([embeddings, embedding]), replies + [response])
 
 
 # -----------------NODES AND INITIATING OUR LLM-------------
+async def ainput(prompt: str) -> str:
+    """
+    input() without blocking the event loop.
+    It runs in a daemon thread rather than the default executor: asyncio.run
+    waits for executor threads on shutdown, so a thread stuck in input()
+    would keep Ctrl+C from ever exiting the program.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def deliver(set_outcome, value):
+        if not future.done():  # the wait may have been cancelled (Ctrl+C)
+            set_outcome(value)
+
+    def read():
+        try:
+            outcome = (future.set_result, input(prompt))
+        except BaseException as e:  # EOFError etc. are re-raised in model_call
+            outcome = (future.set_exception, e)
+        try:
+            loop.call_soon_threadsafe(deliver, *outcome)
+        except RuntimeError:
+            pass  # the event loop is already closed
+
+    threading.Thread(target=read, daemon=True).start()
+    return await future
+
+
 # This function will run inside the "agent" node of the graph
-def model_call(state: AgentState) -> AgentState:
-    # System message → gives strict rules to the LLM
-    system_prompt = SystemMessage(content=f"""
-    You are a helpful document drafter AI assistant. 
-    Your job is to update, edit, and improve the document based on the user's instructions. 
-
-    RULES:
-    - NEVER output <tool-use>, JSON, or function call text.
-    - When updating text, ALWAYS call the `update` tool with the full new text as the "content" argument.
-    - NEVER print the document content in your chat reply.
-    - When saving, ONLY call the `save` tool with a filename.
-    - After a tool call, your *natural language reply* must be short and conversational (e.g., "I've updated the draft." or "File saved successfully.").
-
-    The current document is: {document_content}
-    """)
+# It is async so the event loop stays free while we wait on the network
+async def model_call(state: AgentState) -> AgentState:
+    global _last_sent_doc_hash, _warmup_task
+    # The document only goes out when it changed since the last turn.
+    # It is kept in the history, so the LLM still sees it on later turns.
+    new_messages = []
+    doc_hash = hash(document_content)
+    if doc_hash != _last_sent_doc_hash:
+        new_messages.append(HumanMessage(content=f"<doc>{document_content}</doc>", name="document"))
+        _last_sent_doc_hash = doc_hash
+
+    # Warm the connection up while the user is still typing
+    if os.getenv("DRAFTER_WARMUP") == "1" and connection_cold():
+        _warmup_task = asyncio.create_task(warmup())
 
     # If no messages yet → this is the very first user input
+    # input() blocks, so it runs in a background thread instead of on the event loop
     if not state["messages"]:
-        user_input = input("I'm ready to help you update your draft. What would you like to do? ")
+        user_input = await ainput("I'm ready to help you update your draft. What would you like to do? ")
     else:
-        user_input = input("What would you like to do? ")  # prompt for next action
+        user_input = await ainput("What would you like to do? ")  # prompt for next action
     print(f"\nUSER: {user_input}")
     user_message = HumanMessage(content=user_input)  # wrap input in a HumanMessage
-
-    # Combine system + previous history + new user message
-    all_messages = [system_prompt] + list(state["messages"]) + [user_message]
-    response = model.invoke(all_messages)  # call LLM
-    print(f"\nAI: {response.content}")  # show what LLM responded in plain text
-
-    # If LLM decided to use a tool → print which tool
-    if hasattr(response, "tool_calls") and response.tool_calls:
-        print(f"USING TOOLS: {[tc['name'] for tc in response.tool_calls]}")
-
-    # Return updated message history to the graph
-    return {"messages": add_messages(state["messages"], [user_message, response])}
+    new_messages.append(user_message)
+
+    # Combine static system prompt + previous history + (changed document) + new user message
+    # (one unpacking list build instead of list() + two concatenations)
+    all_messages = [_SYS_MSG, *state["messages"], *new_messages]
+    last_ai = next((m for m in reversed(state["messages"]) if m.type == "ai"), None)  # the turn the user is answering
+    route = pick_model(user_input, last_ai)  # clear chat → skip the tool schemas, clear commands → force a tool call
+
+    # Same draft + nearly the same instruction as before → reuse that reply
+    response = None
+    use_semantic = _st_model is not None and not is_reply_to_ai(user_input, last_ai)
+    if use_semantic:
+        semantic_key = (doc_hash, route)
+        # Encoding is CPU work, keep it off the event loop
+        embedding = await asyncio.to_thread(_st_model.encode, user_input, normalize_embeddings=True)
+        cached = semantic_get(semantic_key, embedding)
+        if cached is not None:
+            response = replay(cached)
+
+    if response is None:
+        response = await cached_invoke(all_messages, route)  # call LLM (or reuse a cached reply), printing the reply as it comes
+        if use_semantic:
+            semantic_put(semantic_key, embedding, response)
+
+    # If LLM decided to use a tool → log which tool (the names are only joined when DEBUG is on)
+    if response.tool_calls and log.isEnabledFor(logging.DEBUG):
+        log.debug("USING TOOLS: %s", ", ".join(tc["name"] for tc in response.tool_calls))
+
+    # Return only the new messages: the windowed_add reducer on AgentState appends them to the history
+    return {"messages": new_messages + [response]}
+
+
+# -----------------TOOLS NODE----------
+tool_node = ToolNode(tools)  # executes update/patch/save
+
+
+# This function will run inside the "tools" node of the graph
+# It takes the node's config so ToolNode gets the LangGraph runtime explicitly
+# (Python < 3.11 doesn't pass it on to nested async calls by itself)
+async def run_tools(state: AgentState, config: RunnableConfig) -> AgentState:
+    tool_calls = getattr(state["messages"][-1], "tool_calls", [])  # the agent's latest reply
+    edits = [tc for tc in tool_calls if tc["name"] != "save"]
+    saves = [tc for tc in tool_calls if tc["name"] == "save"]
+
+    tool_messages = []
+    # update/patch all rewrite the same draft, so they run one by one, in the order the LLM asked
+    for call in edits:
+        tool_messages += (await tool_node.ainvoke([call], config))["messages"]
+    # saves only read the finished draft, so ToolNode runs them concurrently
+    if saves:
+        tool_messages += (await tool_node.ainvoke(saves, config))["messages"]
+
+    # save() puts a True artifact on its ToolMessage when the file was written
+    saved = any(message.name == "save" and message.artifact for message in tool_messages)
+    return {"messages": tool_messages, "saved": saved}
 
 
 # -----------------CONDITIONAL EDGE----------
 # This function decides if graph should continue looping or end
 def should_continue(state: AgentState) -> str:
-    messages = state["messages"]
-    if not messages:
-        return "continue"
-
-    # Walk messages in reverse (from newest to oldest)
-    for message in reversed(messages):
-        if isinstance(message, ToolMessage):  # check if it's a tool result
-            content_lower = message.content.lower()
-            if "saved successfully" in content_lower:  # save tool succeeded
-                return "end"  # stop the graph
-
-    return "continue"  # otherwise, keep looping
+    # run_tools already checked the save result, so this is a simple lookup
+    return "end" if state.get("saved") else "continue"
 
 
 # ---------THE ROBUST PRINT FUNCTION--------------------------
 def print_messages(messages: list[BaseMessage]) -> None:
     """
-    This function prints the last 3 messages of the conversation.
+    This function logs the last 3 messages of the conversation (at DEBUG level).
     Helps us debug without flooding console with everything.
     """
     if not messages:  # if no messages exist
-        print("No messages yet.")
+        log.debug("No messages yet.")
         return
 
     for message in messages[-3:]:  # only last 3 messages
-        if isinstance(message, ToolMessage):  # if message came from tool
-            print(f"[TOOL] {message.content}")
+        if message.type == "tool":  # if message came from tool (plain attribute check, no isinstance)
+            log.debug("[TOOL] %s", message.content)
         else:
-            message.pretty_print()  # Human/AI messages get nice formatting
+            log.debug("\n%s", message.pretty_repr())  # Human/AI messages get nice formatting
 
 
 # -------------------GRAPH DEFINITION----------------------
 graph = StateGraph(AgentState)  # create state graph with AgentState schema
 graph.add_node("agent", model_call)  # add agent node (LLM call)
-graph.add_node("tools", ToolNode(tools))  # add tools node (executes update/save)
+graph.add_node("tools", run_tools)  # add tools node (executes update/patch/save)
 
 graph.set_entry_point("agent")  # agent node is the start point
 graph.add_edge("agent", "tools")  # after agent, always go to tools
@@ -183,22 +531,38 @@ app = graph.compile()  # compile into runnable app
 
 
 # ----------FINALLY----------------
-def run_document_agent():
-    """
-    Runs the document drafting agent until the user saves.
-    """
-    state: AgentState = {"messages": []}  # initialize empty conversation
+async def _amain():
+    state: AgentState = {"messages": [], "saved": False}  # initialize empty conversation
     print("\n--- Document Drafting Agent Started ---\n")
+    shown_draft = document_content  # the version of the draft the user last saw
 
-    # Run the app step by step (stream yields node executions)
-    for event in app.stream(state):
+    # Run the app step by step (astream yields node executions)
+    async for event in app.astream(state):
         for node_name, output_state in event.items():
-            print(f"\n[DEBUG] Node executed → {node_name}")
-            print_messages(output_state["messages"])  # show last messages
+            # After an update/patch changed the draft, show the user the new version
+            if node_name == "tools" and document_content != shown_draft:
+                print(f"\n--- Current draft ---\n{document_content}\n---------------------")
+                shown_draft = document_content
+
+            # Skip building the debug output entirely unless DEBUG logging is on
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("Node executed → %s", node_name)
+                print_messages(output_state["messages"])  # show last messages
 
     print("\n--- Agent finished execution (document saved) ---")
 
 
+def run_document_agent():
+    """
+    Runs the document drafting agent until the user saves (or presses Ctrl+C).
+    """
+    try:
+        asyncio.run(_amain())
+    except KeyboardInterrupt:
+        print("\n--- Session ended without saving ---")
+        raise SystemExit(130)  # usual exit status for Ctrl+C
+
+
 # Entry point for script
 if __name__ == "__main__":
     run_document_agent()